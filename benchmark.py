@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import websockets
+from PIL import Image
+
+# Benchmarks the websocket bridge in UI mode (main.py) and headless mode (headless.py).
+# Each mode is started as a subprocess in a scratch folder (so config.cfg and the logs of the repo aren't touched), then
+# chat messages and webcam frames are sent to it over real websockets. The server's CPU time (including child processes,
+# e.g. the nicegui reloader) is measured until it is idle again, giving the processing cost of each event.
+# No browser is attached in UI mode, so the UI numbers are a lower bound of its real cost.
+
+ROOT = Path(__file__).parent.resolve()
+HOST = "127.0.0.1"
+WEBCAM_HEADER = struct.Struct("<2sBBIQ")
+
+MODES = {
+    "ui": [sys.executable, str(ROOT / "main.py")],
+    "headless": [sys.executable, str(ROOT / "headless.py")],
+}
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def make_frames(count: int, size: tuple[int, int]) -> list[bytes]:
+    """Generates distinct JPEG frames, so the static frame detection doesn't skip them"""
+    frames = []
+    for _ in range(count):
+        image = Image.effect_noise(size, random.randint(20, 80)).convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=70)
+        frames.append(buffer.getvalue())
+    return frames
+
+
+def get_process_tree_cpu(pid: int) -> float:
+    """Returns the CPU time (user + system, in seconds) of a process and all its descendants"""
+    children: dict[int, list[int]] = {}
+    cpu: dict[int, float] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            stat = Path(f"/proc/{entry}/stat").read_text()
+        except OSError:
+            continue
+        fields = stat[stat.rindex(")") + 2:].split()
+        children.setdefault(int(fields[1]), []).append(int(entry))
+        cpu[int(entry)] = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    total, stack = 0.0, [pid]
+    while stack:
+        current = stack.pop()
+        total += cpu.get(current, 0.0)
+        stack.extend(children.get(current, []))
+    return total
+
+
+async def wait_for_port(port: int, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(HOST, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"Port {port} didn't open")
+
+
+async def wait_for_idle(pid: int, interval: float = 0.5, threshold: float = 0.05) -> float:
+    """Waits until the server uses less than threshold of a CPU over an interval, returning its CPU time"""
+    last = get_process_tree_cpu(pid)
+    while True:
+        await asyncio.sleep(interval)
+        current = get_process_tree_cpu(pid)
+        if current - last < interval * threshold:
+            return current
+        last = current
+
+
+async def drive(comms_port: int, webcam_port: int, messages: int, frames: list[bytes], frame_count: int) -> float:
+    """Sends the chat messages and frames concurrently, returning the time it took"""
+
+    async def send_messages():
+        async with websockets.connect(f"ws://{HOST}:{comms_port}", max_size=None) as websocket:
+            for index in range(messages):
+                content = json.dumps({"sender": "user", "content": f"Benchmark message {index}"})
+                await websocket.send(("#######M" + content).encode("utf-8"))
+
+    async def send_frames():
+        async with websockets.connect(f"ws://{HOST}:{webcam_port}", max_size=None) as websocket:
+            for index in range(frame_count):
+                header = WEBCAM_HEADER.pack(b"WF", 1, WEBCAM_HEADER.size, index, int(time.time() * 1_000_000))
+                await websocket.send(header + frames[index % len(frames)])
+
+    start = time.perf_counter()
+    await asyncio.gather(send_messages(), send_frames())
+    return time.perf_counter() - start
+
+
+async def run_mode(mode: str, messages: int, frames: list[bytes], frame_count: int) -> dict:
+    comms_port, webcam_port, dashboard_port = get_free_port(), get_free_port(), get_free_port()
+    env = dict(os.environ, UWI_HOST=HOST, UWI_COMMS_PORT=str(comms_port), UWI_WEBCAM_PORT=str(webcam_port), UWI_DASHBOARD_PORT=str(dashboard_port))
+
+    workdir = tempfile.TemporaryDirectory(prefix=f"benchmark-{mode}-")
+    started_at = time.perf_counter()
+    process = subprocess.Popen(MODES[mode], cwd=workdir.name, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        await wait_for_port(comms_port)
+        await wait_for_port(webcam_port)
+        startup = time.perf_counter() - started_at
+
+        cpu_before = await wait_for_idle(process.pid)
+        wall_start = time.perf_counter()
+        send_time = await drive(comms_port, webcam_port, messages, frames, frame_count)
+        cpu_after = await wait_for_idle(process.pid)
+        # The idle detection interval is included in the wall time, so compare modes on CPU time
+        cpu = cpu_after - cpu_before
+
+        return {
+            "mode": mode,
+            "startup_s": round(startup, 2),
+            "send_s": round(send_time, 2),
+            "wall_s": round(time.perf_counter() - wall_start, 2),
+            "server_cpu_s": round(cpu, 3),
+            "events_per_cpu_s": round((messages + frame_count) / cpu) if cpu > 0 else None,
+        }
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+        workdir.cleanup()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compares the throughput of the UI and headless modes")
+    parser.add_argument("--messages", type=int, default=2000, help="Chat messages sent on the comms websocket")
+    parser.add_argument("--frames", type=int, default=1000, help="Frames sent on the webcam websocket")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    random.seed(0)
+    frames = make_frames(30, (640, 320))
+
+    for mode in args.modes:
+        print(json.dumps(await run_mode(mode, args.messages, frames, args.frames)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
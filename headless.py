@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+# Objects, none of these import nicegui
+import src.utils as utils
+from src.config import get_config
+from src.metrics import Metrics
+from src.sinks import CallbackSink, LoggerSink, RecorderSink, Sink
+from src.transfers import Transfer, TransferManager, save_transfer
+from src.webcam import LatencyTracker, parse_webcam_frame
+from src.websocket import Websocket
+
+
+class HeadlessApp:
+    """Runs only the websocket bridge, without the dashboard. Every event is handed to the sinks (logger, recorder, your own handlers)."""
+
+    def __init__(self, ws: Websocket, sinks: List[Sink]):
+        self.ws = ws
+        self.sinks = sinks
+
+        self.metrics = Metrics()
+        self.metrics.register_provider("config", get_config().get_effective)
+
+        self.frame_latency = LatencyTracker()
+        self.metrics.register_provider("webcam_latency", self.frame_latency.get_stats)
+
+        self.transfers = TransferManager(on_complete=self.handle_transfer_complete)
+
+        ws.setup_application(self)
+        self.metrics.register_provider("inbound_queues", ws.dispatcher.get_stats)
+
+    def create_dashboard_notification(self, content: str):
+        # There is no dashboard, notifications are dropped
+        return
+
+    def handle_websocket_open(self, websocket_type, resumed=False):
+        for sink in self.sinks:
+            sink.on_open(websocket_type, resumed)
+
+    def handle_websocket_close(self, websocket_type):
+        for sink in self.sinks:
+            sink.on_close(websocket_type)
+
+    def handle_session_end(self):
+        self.transfers.cancel_all()
+        for sink in self.sinks:
+            sink.on_session_end()
+
+    async def process_input(self, data):
+        """Hands incoming comms messages to the sinks
+
+        Args:
+            data (byte[]): The incoming data as a byte array
+        """
+        header = utils.get_header(data)
+        self.metrics.increment(f"messages.{header}")
+
+        if header == utils.MessageTypes.TRANSFER:
+            await self.transfers.handle_message(data[utils.HEADER_LENGTH:])
+            return
+
+        for sink in self.sinks:
+            await sink.on_message(header, data[utils.HEADER_LENGTH:])
+
+    async def process_webcam_data(self, data):
+        """Hands incoming webcam frames to the sinks, without decoding them
+
+        Args:
+            data (byte[]): byte array containing image information
+        """
+        self.metrics.increment("frames")
+        try:
+            header, frame = parse_webcam_frame(data)
+        except ValueError as e:
+            self.frame_latency.record_malformed()
+            print(f"Error: Dropped a malformed webcam frame, {e}.")
+            return
+
+        if header is not None:
+            self.frame_latency.record_sequence(header.sequence)
+            if header.capture_time > 0:
+                self.frame_latency.record("capture_to_receive", time.time() - header.capture_time)
+
+        for sink in self.sinks:
+            await sink.on_frame(header, frame)
+
+    async def handle_transfer_complete(self, transfer: Transfer):
+        path = await asyncio.to_thread(save_transfer, transfer)
+        print(f"[XFER] Received {transfer.name} ({transfer.size} bytes), saved to {path}")
+
+    async def run(self):
+        await self.ws.start_websocket_server()
+        await asyncio.Future()  # The servers run until the process is stopped
+
+
+async def print_message(header: str, payload: bytes):
+    print(f"Received communication: {header} | {payload[0:40]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the websocket bridge without the dashboard")
+    parser.add_argument("--no-log", action="store_true", help="Don't write the chat messages to WebappLogs")
+    parser.add_argument("--record", action="store_true", help="Save the webcam frames under Media/recordings")
+    parser.add_argument("--verbose", action="store_true", help="Print every received message")
+    args = parser.parse_args()
+
+    sinks: List[Sink] = []
+    if not args.no_log:
+        sinks.append(LoggerSink(utils.Logger()))
+    if args.record:
+        sinks.append(RecorderSink())
+    if args.verbose:
+        sinks.append(CallbackSink(on_message=print_message))
+
+    headless_app = HeadlessApp(ws=Websocket(), sinks=sinks)
+    try:
+        asyncio.run(headless_app.run())
+    except KeyboardInterrupt:
+        print(json.dumps(headless_app.metrics.snapshot(), indent=2))
@@ -2,13 +2,22 @@ import asyncio
 from nicegui import app, ui
 from PIL import Image
 import io
+import json
 import os
+import time
 
 # Endpoints
 from src.dashboard import Dashboard
 
 # Objects
 import src.utils as utils
+from src.config import get_config
+from src.metrics import Metrics
+from src.profiling import profiler
+from src.search import SearchIndex
+from src.telemetry import Telemetry
+from src.transfers import Transfer, TransferManager, save_transfer
+from src.webcam import FrameChangeDetector, LatencyTracker, parse_webcam_frame
 from src.websocket import Websocket
 
 
@@ -20,22 +29,55 @@ class App:
 
         self.ws = ws
 
+        # Transport & performance settings, resolved once
+        self.config = get_config()
+
+        # Search index over the chat history and logs of every session
+        self.search_index = SearchIndex()
+        self.search_index.load()
+
         # Logger
-        self.logger = utils.Logger()
+        self.logger = utils.Logger(search_index=self.search_index)
+
+        # Metrics, served under /metrics
+        self.metrics = Metrics()
+
+        # Webcam change detection, skips static frames
+        self.frame_detector = FrameChangeDetector()
+        self.metrics.register_provider("webcam", self.frame_detector.get_stats)
+
+        # Webcam latency, measured from the timestamped frame header
+        self.frame_latency = LatencyTracker()
+        self.metrics.register_provider("webcam_latency", self.frame_latency.get_stats)
+        self.metrics.register_provider("profiling", profiler.get_stats)
+        self.metrics.register_provider("config", self.config.get_effective)
 
         # WebServer
         self.dashboard = Dashboard(ws=ws, logger=self.logger, app=self)
 
         # Clear old session & setup media
         self.setup_media()
+        self.setup_endpoints()
 
         app.on_startup(ws.start_websocket_server)
 
         # Setup websocket with access to main app
         ws.setup_application(self)
+        self.metrics.register_provider("inbound_queues", ws.dispatcher.get_stats)
 
         # Webcam stream buffer
         self.received_bytes = False
+        self.last_frame_time = 0.0  # time.perf_counter() of the last frame displayed, for the frame rate cap
+        self.frames_received = 0  # Every frame received, including the ones skipped or dropped before display
+
+        # Rolling session telemetry, charted on the dashboard and exported to Media/graphs when the session ends
+        self.telemetry = Telemetry()
+        self.setup_telemetry()
+        app.on_startup(self.telemetry.start)
+
+        # Large payloads sent in chunks
+        self.transfers = TransferManager(on_complete=self.handle_transfer_complete)
+        self.metrics.register_provider("transfers", lambda: {"active": self.transfers.get_progress()})
 
         # self.send_message_to_user("Test message from agent!")
 
@@ -55,28 +97,37 @@ class App:
 
         self.create_ui()
 
-        ui.run(host=utils.get_ip(), port=8080, show=False, show_welcome_message=False)
+        host = self.config.host or utils.get_ip()
+        ui.run(host=host, port=self.config.dashboard_port, show=False, show_welcome_message=False)
 
-        print(f"\nDashboard is ready under http://{utils.get_ip()}:8080/dashboard\n")
+        print(f"\nDashboard is ready under http://{host}:{self.config.dashboard_port}/dashboard\n")
 
     def create_ui(self):
         """Creates the main webpage, linking to the dashboard page. You can add other pages here"""
         with ui.row():
             ui.button("Dashboard", on_click=lambda: ui.navigate.to(target="/dashboard"))
 
-    def handle_websocket_open(self, websocket_type):
+    @profiler.timed("app.handle_websocket_open")
+    def handle_websocket_open(self, websocket_type, resumed=False):
         """Handles when websockets open and connect
 
         Args:
             type (str): the type of websocket that connected
+            resumed (bool, optional): whether the comms connection resumed the previous session. Defaults to False.
         """
         if websocket_type == "webcam":
+            self.frame_detector.reset()
+            self.frame_latency.reset()
             self.dashboard.set_webcam_ws_active()
+        elif websocket_type == "comms" and resumed:
+            self.dashboard.set_ws_active()  # Same session, log file & UI, only the status changes
+            self.create_dashboard_notification("[WS] Session resumed.")
         elif websocket_type == "comms":
             self.dashboard.set_ws_active()
             self.dashboard.message_log.clear_messages()  # Clears messages on new connection
             self.dashboard.sync_information()  # Syncs information between dashboard and game
             self.logger.create_new_log()  # Opens a new log, on each connection of the websocket
+            self.telemetry.start_session()  # The exported charts only cover this session
             self.dashboard.redraw()  # Redraws the dashboard to ensure everything is up to date
 
         else:
@@ -93,33 +144,80 @@ class App:
             self.dashboard.set_webcam_ws_inactive()
 
         elif websocket_type == "comms":
-            self.dashboard.set_ws_inactive()
-            self.logger.close_logs()
+            self.dashboard.set_ws_inactive()  # The log stays open until the session expires, in case the connection is resumed
 
         else:
             print(f"Error handling websocket close for type: {websocket_type}!")
 
-    async def save_frame(self, image_data):
+    def handle_session_end(self):
+        """Handles when the comms session ends, i.e. the connection was not resumed within the grace period or a new session started"""
+        session_name = getattr(self.logger, "current_time", f"{utils.get_current_date_formatted()}--{utils.get_current_time_formatted()}")
+        self.logger.close_logs()
+        self.transfers.cancel_all()
+        self.telemetry.export(utils.media_path_graphs, session_name)
+
+    def setup_telemetry(self):
+        """Defines the series sampled by the session telemetry. You can add your own series here"""
+
+        queues = self.ws.dispatcher.queues
+        self.telemetry.add_rate("message_rate", lambda: sum(queue.processed for queue in queues.values()))
+        self.telemetry.add_rate("frame_rate", lambda: self.frames_received)
+        self.telemetry.add_series("queue_depth", lambda: sum(len(queue.items) for queue in queues.values()))
+
+        for stage in self.frame_latency.STAGES:
+            self.telemetry.add_series(stage, lambda stage=stage: self.frame_latency.get_percentiles(stage)["p50"])
+
+    @profiler.timed("app.save_frame")
+    async def save_frame(self, image_data, received_at=None):
         """Saves an image frame
 
         Args:
             image_data (byte[]): The image data in raw form
+            received_at (float, optional): time.perf_counter() when the frame was received, for latency measurements. Defaults to None.
         """
 
-        if not self.dashboard.dashboard_settings.stream_webcam:
+        settings = self.dashboard.dashboard_settings
+        if not settings.stream_webcam or self.dashboard.has_modal_open():
             return
-        
+
+        # Drops frames above the frame rate cap before doing any work
+        if self.config.max_webcam_fps > 0:
+            now = received_at if received_at is not None else time.perf_counter()
+            if now - self.last_frame_time < 1 / self.config.max_webcam_fps:
+                return
+            self.last_frame_time = now
+
+        # Skips the decode, resize and push entirely if the frame is the same as the one being displayed
+        if settings.skip_static_frames and not self.frame_detector.has_changed(image_data, settings.static_frame_threshold or 0.0):
+            return
+
         try:
             loop = asyncio.get_event_loop()
             image = Image.open(io.BytesIO(image_data))
             image.resize(self.dashboard.dashboard_settings.webcam_size)
-            loop.create_task(self.dashboard.set_webcam_image(image))  # Once loaded, sets the image
+            loop.create_task(self.push_frame(image, received_at, time.perf_counter()))  # Once loaded, sets the image
         except RuntimeError:
             # If we're not in a running event loop, run the task manually (blocking)
             image = Image.open(io.BytesIO(image_data))
             image.resize(self.dashboard.dashboard_settings.webcam_size)
-            asyncio.run(self.dashboard.set_webcam_image(image))  # Once loaded, sets the image
+            asyncio.run(self.push_frame(image, received_at, time.perf_counter()))  # Once loaded, sets the image
+
+    @profiler.timed("app.push_frame")
+    async def push_frame(self, image, received_at, decoded_at):
+        """Pushes a decoded frame to the dashboard, recording the pipeline latencies
 
+        Args:
+            image (Image): The decoded frame
+            received_at (float | None): time.perf_counter() when the frame was received
+            decoded_at (float): time.perf_counter() when the frame finished decoding
+        """
+        await self.dashboard.set_webcam_image(image)
+
+        if received_at is not None:
+            self.frame_latency.record("receive_to_decode", decoded_at - received_at)
+            self.frame_latency.record("decode_to_browser", time.perf_counter() - decoded_at)
+
+    @profiler.timed("app.process_input")
     async def process_input(self, data):
         """This is the main method for handling incoming messages.
 
@@ -127,7 +225,7 @@ class App:
             data (byte[]): The incoming data as a byte array
         """
 
-        header = data[0:utils.HEADER_LENGTH].decode("utf-8").replace("#","") #First 8 bytes are the header
+        header = utils.get_header(data) #First 8 bytes are the header
         print(f"Received communication: {header}")
         
         if header == utils.MessageTypes.MESSAGE_TYPE:  # User Message/Prompt
@@ -140,13 +238,48 @@ class App:
             # By default, the dashboard loads all messages from unity, meaning the game's message log replaces the dashboard message log
             self.dashboard.replace_message_log(data[utils.HEADER_LENGTH:])
 
+        if header == utils.MessageTypes.TRANSFER:  # Chunk of a large payload
+            await self.transfers.handle_message(data[utils.HEADER_LENGTH:])
+
+    async def handle_transfer_complete(self, transfer: Transfer):
+        """Handles a fully received and verified chunked transfer
+
+        Args:
+            transfer (Transfer): The completed transfer, its file is closed once this returns
+        """
+
+        if transfer.kind == utils.MessageTypes.MESSAGE_SYNC:  # Large message log
+            data = await asyncio.to_thread(json.load, transfer.file)
+            self.dashboard.load_message_log(data)
+            return
+
+        # If you wish to handle other kinds of payloads (e.g. telemetry dumps), you can do it here. By default they're saved under Media/transfers
+        path = await asyncio.to_thread(save_transfer, transfer)
+        self.create_dashboard_notification(f"[XFER] Received {transfer.name} ({transfer.size} bytes), saved to {path}")
+
+    @profiler.timed("app.process_webcam_data")
     async def process_webcam_data(self, data):
         """Processes webcam data
 
         Args:
             data (byte[]): byte array containing image information
         """
-        asyncio.create_task(self.save_frame(data[1:]))
+        received_at = time.perf_counter()
+        self.frames_received += 1
+        try:
+            header, frame = parse_webcam_frame(data)
+        except ValueError as e:
+            self.frame_latency.record_malformed()
+            print(f"Error: Dropped a malformed webcam frame, {e}.")
+            return
+
+        if header is not None:
+            self.frame_latency.record_sequence(header.sequence)
+            if header.capture_time > 0:
+                # Assumes unity and the server share a clock (e.g. same machine or NTP synced)
+                self.frame_latency.record("capture_to_receive", time.time() - header.capture_time)
+
+        asyncio.create_task(self.save_frame(frame, received_at))
 
     def setup_media(self):
 
@@ -163,6 +296,10 @@ class App:
         # Add static files to the dashboard, meaning files placed in the utils.media_path will be usable by the nicegui application
         app.add_static_files("/media", utils.media_path)
 
+    def setup_endpoints(self):
+        """Adds the non UI endpoints to the webapp"""
+
+        app.add_api_route("/metrics", self.metrics.snapshot, methods=["GET"])
 
 
 if __name__ in {"__main__", "__mp_main__"}:
@@ -1,7 +1,7 @@
-from typing import List
+from typing import Any, Dict, List
+from pathlib import Path
 import json
 import time
-import copy
 
 
 class Message():
@@ -27,8 +27,9 @@ class Message():
 
 class MessageLog():
     
-    def __init__(self, messages = []):
-        self.messages : List[Message] = messages
+    def __init__(self, messages = None, search_index = None):
+        self.messages : List[Message] = messages if messages is not None else []
+        self.search_index = search_index # Optional SearchIndex, every added message is also indexed
         
     def __jsonify__(self):
         return {"messages" : self.messages}
@@ -60,6 +61,9 @@ class MessageLog():
     def add_message(self, message : Message):
         message.stamp = self.get_timestamp()
         self.messages.append(message)
+        
+        if(self.search_index is not None):
+            self.search_index.add_document(message.sender, message.content)
     
     def get_timestamp(self):
         now = time.time()
@@ -67,25 +71,105 @@ class MessageLog():
 
 class PlaceboOption():
     
-    def __init__(self, text, index):
+    def __init__(self, text, index, option_id = 0):
         self.text = text
-        self.index = index
+        self.index = index # The group this option belongs to
+        self.option_id = option_id
 
 class PlaceboManager():
+    """Stores the canned responses operators can send, indexed by group and by prefix so looking up or clearing a group
+    and autocompleting the chat input don't require scanning every option.
+    """
+    
+    PREFIX_LENGTH = 16 # Longer prefixes are resolved by filtering the bucket of the longest indexed prefix
+    
     def __init__(self):
-        self.options : List[PlaceboOption] = []
+        self.groups : Dict[Any, List[PlaceboOption]] = {}
+        self.prefixes : Dict[str, Dict[int, PlaceboOption]] = {}
         self.msg_index = 0
+        self.option_count = 0
+        
+    @property
+    def options(self) -> List[PlaceboOption]:
+        return [option for group in self.groups.values() for option in group]
+        
+    def add_option(self, text : str, index):
+        """Adds a single option to a group, creating the group if needed
+
+        Args:
+            text (str): The response text
+            index (Any): The group id
+        """
+        self.option_count += 1
+        option = PlaceboOption(text, index, self.option_count)
+        self.groups.setdefault(index, []).append(option)
+        
+        for prefix in self.get_prefixes(text):
+            self.prefixes.setdefault(prefix, {})[option.option_id] = option
         
     def add_placebo_options(self,message_pair : tuple[str,str]):
         self.msg_index += 1
-        self.options.append(PlaceboOption(message_pair[0],self.msg_index))
-        self.options.append(PlaceboOption(message_pair[1],self.msg_index))
+        self.add_option(message_pair[0],self.msg_index)
+        self.add_option(message_pair[1],self.msg_index)
         
     def clear_placebo_options(self, index):
-        options_copy = copy.copy(self.options)
-        for option in options_copy:
-            if(option.index == index):
-                self.options.remove(option)
+        for option in self.groups.pop(index, []):
+            for prefix in self.get_prefixes(option.text):
+                bucket = self.prefixes[prefix]
+                del bucket[option.option_id]
+                if(len(bucket) == 0):
+                    del self.prefixes[prefix]
+                    
+    def get_group(self, index) -> List[PlaceboOption]:
+        return self.groups.get(index, [])
+    
+    def get_prefixes(self, text : str) -> List[str]:
+        key = text.lower()
+        return [key[0:length] for length in range(1, min(len(key), self.PREFIX_LENGTH) + 1)]
+    
+    def find_by_prefix(self, prefix : str, limit : int = 9) -> List[PlaceboOption]:
+        """Returns the options starting with the given text (case insensitive)
+
+        Args:
+            prefix (str): The text typed so far
+            limit (int, optional): Maximum amount of options returned. Defaults to 9.
+
+        Returns:
+            List[PlaceboOption]: The matching options, in insertion order
+        """
+        key = prefix.lower()
+        if(key == ""):
+            return []
+        
+        bucket = self.prefixes.get(key[0:self.PREFIX_LENGTH], {})
+        matches = []
+        for option in bucket.values():
+            if(len(key) <= self.PREFIX_LENGTH or option.text.lower().startswith(key)):
+                matches.append(option)
+                if(len(matches) >= limit):
+                    break
+        return matches
+    
+    def load_from_file(self, path : str):
+        """Loads canned responses from a JSON file mapping each group id to a list of responses.
+        e.g. {"greetings": ["Hello!", "Welcome back!"]}
+
+        Args:
+            path (str): Path to the JSON file
+        """
+        if(not Path(path).exists()):
+            return
+        
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error loading canned responses from {path}: {e}")
+            return
+        
+        for group, responses in data.items():
+            for text in responses:
+                self.add_option(text, group)
         
     def get_message_from_option(self, message : PlaceboOption):
         try:
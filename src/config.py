@@ -0,0 +1,169 @@
+import asyncio
+import os
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import src.utils as utils
+
+
+class TransportConfig():
+    """The transport & performance settings of the bridge. Values are resolved once at startup, from the defaults below,
+    then settings.cfg (KEY = VALUE lines), then environment variables (UWI_KEY=VALUE).
+    Settings marked as hot reloadable are applied when settings.cfg changes, the others require a restart.
+    """
+
+    # Setting -> (type, hot reloadable)
+    FIELDS: Dict[str, tuple[type, bool]] = {
+        "host": (str, False),
+        "dashboard_port": (int, False),
+        "comms_port": (int, False),
+        "webcam_port": (int, False),
+        "comms_max_message_size": (int, False),
+        "webcam_max_message_size": (int, False),
+        "comms_compression": (bool, False),
+        "webcam_compression": (bool, False),
+        "ping_interval": (float, False),
+        "ping_timeout": (float, False),
+        "max_queue": (int, False),
+        "write_limit": (int, False),
+        "session_buffer_size": (int, False),
+        "session_grace_period": (float, True),
+        "inbound_queue_size": (int, True),
+        "inbound_max_concurrency": (int, True),
+        "max_webcam_fps": (float, True),
+    }
+
+    def __init__(self):
+        self.host: str = ""  # Empty uses the local network IP
+        self.dashboard_port: int = 8080
+        self.comms_port: int = utils.WEBSOCKET_COMMS_PORT
+        self.webcam_port: int = utils.WEBSOCKET_WEBCAM_PORT
+        self.comms_max_message_size: int = 1024 * 1024  # Larger payloads should use chunked transfers
+        self.webcam_max_message_size: int = utils.WEBSOCKET_MSG_SIZE
+        self.comms_compression: bool = True
+        self.webcam_compression: bool = False  # Frames are already compressed (JPEG), deflating them only costs CPU on both ends
+        self.ping_interval: float = 5  # Keepalive, in seconds
+        self.ping_timeout: float = 5
+        self.max_queue: int = 16  # Incoming messages buffered by the websocket library per connection
+        self.write_limit: int = 32 * 1024  # Outgoing bytes buffered before sending waits
+        self.session_buffer_size: int = utils.SESSION_BUFFER_SIZE
+        self.session_grace_period: float = utils.SESSION_RESUME_GRACE_PERIOD
+        self.inbound_queue_size: int = utils.INBOUND_QUEUE_SIZE
+        self.inbound_max_concurrency: int = utils.INBOUND_MAX_CONCURRENCY
+        self.max_webcam_fps: float = 0  # Frames displayed per second, 0 is uncapped
+
+        self.path = utils.settings_path
+        self.last_modified = 0.0
+        self.listeners: List[Callable[["TransportConfig"], None]] = []
+
+    def load(self):
+        """Resolves the settings from settings.cfg and the environment"""
+
+        for key, value in self.read_file().items():
+            self.set_value(key, value)
+
+        for key in self.FIELDS:
+            value = os.environ.get(f"UWI_{key.upper()}")
+            if value is not None:
+                self.set_value(key, value)
+
+    def read_file(self) -> Dict[str, str]:
+        if not Path(self.path).exists():
+            return {}
+
+        self.last_modified = os.path.getmtime(self.path)
+        values = {}
+        with open(self.path, "r") as file:
+            for line in file:
+                line = line.split("#", 1)[0].strip()
+                if "=" not in line:
+                    continue
+                key, value = line.split("=", 1)
+                values[key.strip().lower()] = value.strip()
+        return values
+
+    def parse_value(self, key: str, value: str):
+        """Parses a setting to its type, returning None if it is unknown or invalid"""
+
+        if key not in self.FIELDS:
+            print(f"Unknown setting {key}, ignoring it.")
+            return None
+
+        field_type = self.FIELDS[key][0]
+        try:
+            return value.lower() in ("1", "true", "yes", "on") if field_type is bool else field_type(value)
+        except ValueError:
+            print(f"Invalid value {value} for setting {key}, ignoring it.")
+            return None
+
+    def set_value(self, key: str, value: str) -> bool:
+        """Parses and sets a setting, returning whether its value changed"""
+
+        parsed = self.parse_value(key, value)
+        if parsed is None or getattr(self, key) == parsed:
+            return False
+
+        setattr(self, key, parsed)
+        return True
+
+    # region - Hot reload
+
+    def on_reload(self, listener: Callable[["TransportConfig"], None]):
+        """Registers a function called after hot reloadable settings change"""
+        self.listeners.append(listener)
+
+    def reload(self):
+        """Re-reads settings.cfg, applying the hot reloadable settings. They are resolved again from the defaults, the file
+        and the environment, so commenting a line out restores its default.
+        """
+
+        defaults = TransportConfig()
+        values = self.read_file()
+
+        changed = []
+        for key, (_, hot_reloadable) in self.FIELDS.items():
+            resolved = getattr(defaults, key)
+            for value in [values.get(key), os.environ.get(f"UWI_{key.upper()}")]:
+                parsed = self.parse_value(key, value) if value is not None else None
+                if parsed is not None:
+                    resolved = parsed
+
+            if resolved == getattr(self, key):
+                continue
+
+            if hot_reloadable:
+                setattr(self, key, resolved)
+                changed.append(key)
+            else:
+                print(f"Setting {key} changed, restart to apply it.")
+
+        if len(changed) > 0:
+            print(f"Reloaded settings: {', '.join(changed)}")
+            for listener in self.listeners:
+                listener(self)
+
+    async def watch(self, interval: float = 2.0):
+        """Reloads the settings whenever settings.cfg is modified"""
+
+        while True:
+            await asyncio.sleep(interval)
+            if Path(self.path).exists() and os.path.getmtime(self.path) != self.last_modified:
+                self.reload()
+
+    # endregion
+
+    def get_effective(self) -> dict:
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+
+config: TransportConfig | None = None
+
+
+def get_config() -> TransportConfig:
+    """Returns the settings, resolving them the first time"""
+
+    global config
+    if config is None:
+        config = TransportConfig()
+        config.load()
+    return config
@@ -1,9 +1,11 @@
 from nicegui import ui, context
 from src.utils import StylingHelper, media_path
+import functools
 import json
 import time
 # Objects
-from src.Messages.message import Message, MessageLog
+from src.Messages.message import Message, MessageLog, PlaceboManager, PlaceboOption
+from src.profiling import profiler
 from src.websocket import Websocket
 import src.utils as utils
 
@@ -14,6 +16,8 @@ class DashboardSettings:
     def __init__(self):
         self.stream_webcam: bool = True
         self.webcam_size = (640, 320) #The size of the webcam preview
+        self.skip_static_frames: bool = True #Skips decoding and pushing frames identical to the one being displayed
+        self.static_frame_threshold: float = 0.0 #Mean pixel difference (0-1) under which frames count as static, 0 only skips exact duplicates
 
 class Dashboard:
 
@@ -35,22 +39,33 @@ class Dashboard:
         self.robot_icon = f"https://robohash.org/{current_time}?set=set3"
 
         # Message logs
-        self.message_log = MessageLog()
+        self.message_log = MessageLog(search_index=app.search_index)
         self.text_input = ""
 
+        # History search
+        self.search_query = ""
+
+        # Canned responses, sent with Alt+1..9
+        self.placebo_manager = PlaceboManager()
+        self.placebo_manager.load_from_file(utils.canned_responses_path)
+        self.selected_response_group = next(iter(self.placebo_manager.groups), None)
+
         # Dashboard Settings
         self.dashboard_settings = DashboardSettings()
 
         # Dialogs
         self.settings_opened = False
+        self.profiling_expanded = False  # Kept across redraws
 
     # region - UI functions
     @ui.refreshable
+    @profiler.timed("dashboard.create_dashboard")
     def create_dashboard(self):
         """Main function that draws the dashboard interface
         """
         
         self.client = context.client # Fetches the current client from the app context
+        self.app.frame_detector.reset() # The new page starts with the placeholder, so the next frame must be pushed even if static
         
         ui.page_title("Dashboard")
 
@@ -58,6 +73,8 @@ class Dashboard:
         
         self.draw_dialogs() 
 
+        ui.keyboard(on_key=self.handle_key, ignore=[]) # Also active while typing in the chat input
+
         with ui.row().classes("w-full mt-4"):
 
             # Webcam Preview
@@ -68,6 +85,61 @@ class Dashboard:
 
             # WoZ Actions
             self.draw_control_actions()
+
+        # Session telemetry
+        self.draw_telemetry()
+
+        # Profiling, on the page rather than in the settings dialog so the webcam keeps streaming while profiling
+        self.draw_profiling()
+    # endregion
+    
+    # region - Telemetry
+
+    def draw_telemetry(self):
+        """Draws the session telemetry charts, only updated when new samples arrive
+        """
+        
+        self.telemetry_charts = {}
+        self.telemetry_version = -1
+        self.telemetry_samples_seen = 0  # Sample index the charts of this page are up to date with
+        
+        with ui.row().classes("w-full no-wrap px-4"):
+            for chart, (label, names) in self.app.telemetry.CHARTS.items():
+                options = {
+                    "title": {"text": chart.capitalize(), "textStyle": {"fontSize": 14}},
+                    "tooltip": {"trigger": "axis"},
+                    "legend": {"top": 0, "right": 0},
+                    "animation": False,
+                    "xAxis": {"type": "time"},
+                    "yAxis": {"type": "value", "name": label},
+                    "series": [{"name": name.replace("_", " "), "type": "line", "showSymbol": False, "data": []} for name in names],
+                }
+                self.telemetry_charts[chart] = ui.echart(options).classes(f"rounded bg-white {self.sh.border_color} border-solid {self.sh.border_thickness}").style("height:250px; width:50%;")
+        
+        self.update_telemetry()
+        ui.timer(self.app.telemetry.interval, self.update_telemetry)
+
+    def update_telemetry(self):
+        """Appends the samples taken since the last update to the charts, skipped while no value changed
+        """
+        
+        telemetry = self.app.telemetry
+        if telemetry.version == self.telemetry_version:
+            return
+        self.telemetry_version = telemetry.version
+        
+        since = self.telemetry_samples_seen
+        self.telemetry_samples_seen = telemetry.sample_count
+        
+        for chart, (_, names) in telemetry.CHARTS.items():
+            echart = self.telemetry_charts[chart]
+            for index, name in enumerate(names):
+                data = echart.options["series"][index]["data"]
+                data.extend(telemetry.get_points(name, since))
+                if len(data) > telemetry.capacity:
+                    del data[0:len(data) - telemetry.capacity]  # Keeps the same window as the ring buffers
+            echart.update()
+
     # endregion
     
     # region - Dialogs (Cards)
@@ -103,6 +175,7 @@ class Dashboard:
     # region - Webcam
 
     @ui.refreshable
+    @profiler.timed("dashboard.draw_webcam_preview")
     def draw_webcam_preview(self):
         """Draws the webcam preview, using the image defined
         """
@@ -114,6 +187,8 @@ class Dashboard:
             with ui.column().classes("w-full items-center"):
                 self.draw_ws_status()
                 self.draw_webcam_status()
+                self.draw_latency_stats()
+                ui.timer(1.0, self.draw_latency_stats.refresh)
 
     @ui.refreshable
     def draw_ws_status(self):
@@ -140,10 +215,29 @@ class Dashboard:
             else:
                 ui.icon(name="cancel", color="red").props("size=md")
 
+    @ui.refreshable
+    @profiler.timed("dashboard.draw_latency_stats")
+    def draw_latency_stats(self):
+        """Draws the webcam latency percentiles, for each stage of the pipeline
+        """
+        
+        stats = self.app.frame_latency.get_stats()
+        with ui.grid(columns=4).classes("gap-x-4 gap-y-0 text-sm"):
+            for column in ["Latency (ms)", "p50", "p95", "p99"]:
+                ui.label(column).classes("text-weight-bold")
+            for stage in self.app.frame_latency.STAGES:
+                ui.label(stage.replace("_", " "))
+                for percentile in ["p50", "p95", "p99"]:
+                    value = stats[stage][percentile]
+                    ui.label("-" if value is None else f"{value:.1f}")
+        ui.label(f"Dropped frames (sequence gaps): {stats['sequence_gaps']}").classes("text-sm")
+        ui.label(f"Malformed frames: {stats['malformed_frames']}").classes("text-sm")
+
     # endregion
     
     # region - Chatbox
     @ui.refreshable
+    @profiler.timed("dashboard.draw_chatbox")
     def draw_chatbox(self):
         """Draws the chatbox, containing the messages exchanged between user and server
         """
@@ -153,11 +247,22 @@ class Dashboard:
             with ui.scroll_area().classes(f"rounded {self.sh.border_color} {self.sh.chat_color} border-solid {self.sh.border_thickness}").style("height:450px;") as scroll:
                 scroll.scroll_to(percent=1)
                 self.draw_messages()
-            ui.input(label="Type here").bind_value(self, "text_input").on("keydown.enter", self.submit_message).classes(f"{self.sh.chat_color} rounded {self.sh.border_color} border-solid {self.sh.border_thickness} px-2 py-1").style(
+            ui.input(label="Type here", autocomplete=[option.text for option in self.placebo_manager.options], on_change=self.draw_suggestions.refresh).bind_value(self, "text_input").on("keydown.enter", self.submit_message).classes(f"{self.sh.chat_color} rounded {self.sh.border_color} border-solid {self.sh.border_thickness} px-2 py-1").style(
                 "width:100%; margin-top:-15px;"
             )
+            self.draw_suggestions()
 
     @ui.refreshable
+    def draw_suggestions(self):
+        """Draws the canned responses matching the chat input, or the selected group when the input is empty. Each one can be sent with Alt+<number>
+        """
+        
+        with ui.row().classes("w-full gap-1"):
+            for number, option in enumerate(self.get_suggestions(), start=1):
+                ui.chip(f"{number}: {option.text}", on_click=functools.partial(self.send_canned_response, option)).props("dense clickable").classes("text-xs")
+
+    @ui.refreshable
+    @profiler.timed("dashboard.draw_messages")
     def draw_messages(self):
         """Draws the messages, on the left we display messages from the user, on the right messages sent by the server
         """
@@ -172,6 +277,7 @@ class Dashboard:
     # endregion
     # region - Actions
     @ui.refreshable
+    @profiler.timed("dashboard.draw_control_actions")
     def draw_control_actions(self):
         """Draws the control actions / the action buttons
         """
@@ -182,6 +288,47 @@ class Dashboard:
                 ui.label("Change App Settings").classes('text-3xl')
                 with ui.button(text="App Settings",on_click=self.open_app_settings,color=self.sh.button_main_color).classes("text-white"): #To add a tooltip to a button, use the with: keyword
                     ui.tooltip('Configure the app')
+
+                if len(self.placebo_manager.groups) > 0:
+                    ui.label("Canned Responses").classes('text-3xl')
+                    ui.select(list(self.placebo_manager.groups), label="Group", on_change=self.draw_suggestions.refresh).bind_value(self, "selected_response_group").style("width:100%;")
+
+                self.draw_transfers()
+                ui.timer(1.0, self.draw_transfers.refresh)
+
+                ui.label("Search History").classes('text-3xl')
+                ui.input(label="Search messages & logs", on_change=self.draw_search_results.refresh).bind_value(self, "search_query").classes(f"{self.sh.chat_color} rounded {self.sh.border_color} border-solid {self.sh.border_thickness} px-2 py-1").style("width:100%;")
+                self.draw_search_results()
+
+    @ui.refreshable
+    def draw_transfers(self):
+        """Draws the progress of the chunked transfers being received
+        """
+        
+        transfers = self.app.transfers.get_progress()
+        if len(transfers) == 0:
+            return
+        
+        ui.label("Transfers").classes('text-3xl')
+        for transfer in transfers:
+            ui.label(f"{transfer['name']} ({transfer['received'] // 1024} / {transfer['size'] // 1024} KB)").classes("text-sm")
+            ui.linear_progress(value=transfer["progress"], show_value=False).classes("w-full")
+
+    @ui.refreshable
+    @profiler.timed("dashboard.draw_search_results")
+    def draw_search_results(self):
+        """Draws the results of the history search, across every past session
+        """
+
+        results = self.app.search_index.search(self.search_query)
+        if len(results) == 0:
+            return
+
+        with ui.scroll_area().classes(f"rounded {self.sh.border_color} {self.sh.chat_color} border-solid {self.sh.border_thickness}").style("height:250px;"):
+            for result in results:
+                with ui.column().classes("w-full gap-0"):
+                    ui.label(f"{result['session']} | {result['timestamp']} | {result['sender'].upper()}").classes("text-xs text-grey-8")
+                    ui.label(result["content"])
                     
     @ui.refreshable
     def draw_dashboard_options(self):
@@ -191,6 +338,47 @@ class Dashboard:
             ui.label("Stream Webcam: ").classes("text-white text-weight-bold lg").style("display: contents !important;")
             ui.checkbox().bind_value(self.dashboard_settings,"stream_webcam").classes("text-weight-bold lg").props('color=blue-9 label-color=white input-class=text-white').style("display: contents !important;")
 
+        with ui.row().classes(f"bg-{self.sh.button_main_color}  rounded items-center").style("width:auto; padding-left:10px;"):
+            ui.label("Skip Static Frames: ").classes("text-white text-weight-bold lg").style("display: contents !important;")
+            ui.checkbox().bind_value(self.dashboard_settings,"skip_static_frames").classes("text-weight-bold lg").props('color=blue-9 label-color=white input-class=text-white').style("display: contents !important;")
+            ui.number(label="Static threshold", min=0, max=1, step=0.005, format="%.3f").bind_value(self.dashboard_settings,"static_frame_threshold").props('dark dense label-color=white input-class=text-white').style("width:120px; padding-right:10px;")
+
+    def draw_profiling(self):
+        """Draws the collapsible profiling panel
+        """
+        with ui.row().classes("w-full px-4 mb-4"):
+            with ui.expansion("Profiling", icon="speed").bind_value(self, "profiling_expanded").classes(f"w-full rounded bg-white {self.sh.border_color} border-solid {self.sh.border_thickness}"):
+                self.draw_profiling_options()
+                self.draw_profiling_results()
+
+    def draw_profiling_options(self):
+        """Draws the profiling toggles, all of them can be switched at runtime
+        """
+        with ui.row().classes("items-center"):
+            ui.switch("Handler timings").bind_value(profiler, "enabled")
+            ui.switch("Slow callbacks", value=profiler.detect_slow_callbacks, on_change=lambda e: profiler.set_slow_callback_detection(e.value))
+            ui.number(label="Slow callback threshold (s)", value=profiler.slow_callback_threshold, min=0.001, step=0.01, on_change=lambda e: profiler.set_slow_callback_threshold(e.value or profiler.slow_callback_threshold)).style("width:180px;")
+            ui.switch("Sampling profiler", value=profiler.sampling, on_change=lambda e: profiler.set_sampling(e.value))
+
+        with ui.row():
+            ui.button("Refresh", on_click=self.draw_profiling_results.refresh, color=self.sh.button_main_color).classes("text-white")
+            ui.button("Dump to file", on_click=self.dump_profile, color=self.sh.button_main_color).classes("text-white")
+            ui.button("Reset", on_click=lambda: (profiler.reset(), self.draw_profiling_results.refresh()), color=self.sh.button_main_color).classes("text-white")
+
+    @ui.refreshable
+    def draw_profiling_results(self):
+        """Draws the collected handler timings and slow callbacks
+        """
+        stats = profiler.get_stats()
+
+        rows = [{"name": name, **timing} for name, timing in sorted(stats["handlers"].items(), key=lambda item: -item[1]["total_ms"])]
+        columns = [{"name": key, "label": label, "field": key, "sortable": True} for key, label in [("name", "Handler"), ("calls", "Calls"), ("total_ms", "Total (ms)"), ("mean_ms", "Mean (ms)"), ("max_ms", "Max (ms)")]]
+        ui.table(columns=columns, rows=rows, row_key="name").props("dense flat").classes("w-full")
+
+        ui.label(f"Stack samples: {stats['samples']}")
+        for slow_callback in stats["slow_callbacks"][-10:]:
+            ui.label(slow_callback).classes("text-xs text-red-9")
+
     # region - Image
     
     async def set_webcam_image(self, image_data):
@@ -216,6 +404,7 @@ class Dashboard:
     # endregion
     
     # region - Message
+    @profiler.timed("dashboard.save_message_json")
     def save_message_json(self, message_data) -> str:
         """Saves a received message in json format, converting it to Message and returning its contents
 
@@ -236,6 +425,7 @@ class Dashboard:
         self.notify_safe("[SYNC] Received a new message.")
         return message.content
 
+    @profiler.timed("dashboard.replace_message_log")
     def replace_message_log(self, message_log):
         """Replaces the dashboard message log with the provided one
 
@@ -244,7 +434,15 @@ class Dashboard:
         """
         
         data_json = message_log.decode("utf-8")
-        data = json.loads(data_json)
+        self.load_message_log(json.loads(data_json))
+
+    def load_message_log(self, data: dict):
+        """Replaces the dashboard message log with an already parsed one, e.g. received through a chunked transfer
+
+        Args:
+            data (dict): The parsed message log
+        """
+        
         self.message_log.replace_message_log(data)  # Replace our message log with the received one
         self.draw_chatbox.refresh()
         self.notify_safe("[SYNC] Synchronized the chat logs.")
@@ -271,6 +469,32 @@ class Dashboard:
         
         self.text_input = ""
 
+    def get_suggestions(self) -> list[PlaceboOption]:
+        """Returns the canned responses currently offered to the operator, at most 9
+        """
+        if self.text_input != "":
+            return self.placebo_manager.find_by_prefix(self.text_input)
+        return self.placebo_manager.get_group(self.selected_response_group)[0:9]
+
+    async def send_canned_response(self, option: PlaceboOption):
+        msg = Message(content=option.text, sender="server")
+
+        self.save_message(msg)
+
+        await self.send_message(msg)
+
+        self.text_input = ""
+
+    async def handle_key(self, e):
+        """Sends the n-th suggested canned response when Alt+<n> is pressed
+        """
+        if not e.action.keydown or not e.modifiers.alt or e.key.number is None:
+            return
+
+        suggestions = self.get_suggestions()
+        if 1 <= e.key.number <= len(suggestions):
+            await self.send_canned_response(suggestions[e.key.number - 1])
+
     async def send_message(self, msg: Message):
         content = msg.__jsonify__()
         type = utils.MessageTypes.MESSAGE_TYPE
@@ -288,6 +512,12 @@ class Dashboard:
     # region - Button actions 
     # Define your button actions here for organization's sake
 
+    def dump_profile(self):
+        """Dumps the profiling results to a file, the collapsed stacks can be opened with flamegraph.pl or speedscope
+        """
+        path = profiler.dump(utils.profile_path)
+        self.notify_safe(f"Profile saved to {path}")
+
     def open_app_settings(self):
         """Opens the dialog/card that contains the app settings
         """
@@ -0,0 +1,144 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict
+
+import src.utils as utils
+
+
+class InboundQueue():
+    """The pending messages of a single message type, along with its scheduling settings and statistics"""
+
+    def __init__(self, message_type: str, priority: int, concurrency: int, max_size: int):
+        self.message_type = message_type
+        self.priority = priority  # Higher priorities are processed first when workers are scarce
+        self.concurrency = concurrency  # 1 keeps the messages of this type strictly in order
+        self.max_size = max_size
+
+        self.items: Deque[tuple[float, bytes]] = deque()
+        self.in_flight = 0
+        self.has_space = asyncio.Event()
+        self.has_space.set()
+
+        # Statistics
+        self.processed = 0
+        self.max_depth = 0
+        self.wait_times: Deque[float] = deque(maxlen=256)
+
+    def is_ready(self) -> bool:
+        return len(self.items) > 0 and self.in_flight < self.concurrency
+
+    def get_stats(self) -> dict:
+        waits = sorted(self.wait_times)
+        return {
+            "priority": self.priority,
+            "concurrency": self.concurrency,
+            "depth": len(self.items),
+            "max_depth": self.max_depth,
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "wait_p50_ms": round(waits[len(waits) // 2] * 1000, 2) if len(waits) > 0 else None,
+            "wait_max_ms": round(waits[-1] * 1000, 2) if len(waits) > 0 else None,
+        }
+
+
+class InboundDispatcher():
+    """Decouples receiving comms messages from processing them. The websocket receive loop only enqueues messages into a queue
+    per message type, and messages are handed to the handler by priority, within a shared concurrency limit.
+    Messages of the same type are processed in order (with a concurrency of 1), there is no ordering between different types.
+    """
+
+    def __init__(self, handler: Callable[[bytes], Awaitable], max_concurrency: int = utils.INBOUND_MAX_CONCURRENCY, max_queue_size: int = utils.INBOUND_QUEUE_SIZE):
+        self.handler = handler
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+
+        self.queues: Dict[str, InboundQueue] = {}
+        self.running = 0
+
+        for message_type, (priority, concurrency) in utils.INBOUND_QUEUES.items():
+            self.configure(message_type, priority, concurrency)
+
+    def configure(self, message_type: str, priority: int, concurrency: int = 1):
+        """Sets the scheduling of a message type
+
+        Args:
+            message_type (str): The message type, as in utils.MessageTypes
+            priority (int): Higher priorities are processed first
+            concurrency (int, optional): How many messages of this type can be processed at once. Defaults to 1, keeping them in order.
+        """
+        if message_type in self.queues:
+            self.queues[message_type].priority = priority
+            self.queues[message_type].concurrency = concurrency
+        else:
+            self.queues[message_type] = InboundQueue(message_type, priority, concurrency, self.max_queue_size)
+
+    def set_limits(self, max_concurrency: int, max_queue_size: int):
+        """Changes the concurrency and queue size limits at runtime
+
+        Args:
+            max_concurrency (int): Messages processed at once, across all types
+            max_queue_size (int): Messages waiting per type before the websocket stops being read
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+
+        for queue in self.queues.values():
+            queue.max_size = max_queue_size
+            if len(queue.items) < max_queue_size:
+                queue.has_space.set()
+        self.schedule()
+
+    def get_queue(self, message_type: str) -> InboundQueue:
+        if message_type not in self.queues:
+            priority, concurrency = utils.INBOUND_DEFAULT_QUEUE
+            self.configure(message_type, priority, concurrency)
+        return self.queues[message_type]
+
+    async def submit(self, data: bytes):
+        """Enqueues a received message. Only waits if the queue of its type is full, which stops reading from the websocket (backpressure).
+
+        Args:
+            data (bytes): The message, including its header
+        """
+        queue = self.get_queue(utils.get_header(data))
+
+        while len(queue.items) >= queue.max_size:
+            queue.has_space.clear()
+            await queue.has_space.wait()
+
+        queue.items.append((time.perf_counter(), data))
+        queue.max_depth = max(queue.max_depth, len(queue.items))
+        self.schedule()
+
+    def schedule(self):
+        """Starts processing the highest priority messages, while there are workers available"""
+
+        while self.running < self.max_concurrency:
+            ready = [queue for queue in self.queues.values() if queue.is_ready()]
+            if len(ready) == 0:
+                return
+
+            # Highest priority first, then the queue whose oldest message waited the longest
+            queue = min(ready, key=lambda q: (-q.priority, q.items[0][0]))
+            enqueued_at, data = queue.items.popleft()
+            queue.wait_times.append(time.perf_counter() - enqueued_at)
+            queue.has_space.set()
+
+            queue.in_flight += 1
+            self.running += 1
+            asyncio.get_running_loop().create_task(self.process(queue, data))
+
+    async def process(self, queue: InboundQueue, data: bytes):
+        try:
+            await self.handler(data)
+        except Exception as e:
+            print(f"Error processing {queue.message_type} message: {e}")
+        finally:
+            queue.in_flight -= 1
+            queue.processed += 1
+            self.running -= 1
+            self.schedule()
+
+    def get_stats(self) -> dict:
+        return {message_type: queue.get_stats() for message_type, queue in self.queues.items()}
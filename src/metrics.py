@@ -0,0 +1,44 @@
+from typing import Callable, Dict
+
+
+class Metrics():
+    """Collects counters and statistics from the different parts of the application, so they can be inspected
+    under the /metrics endpoint. Components can either increment counters directly or register a provider,
+    a function that returns a dictionary with their current statistics.
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, int] = {}
+        self.providers: Dict[str, Callable[[], dict]] = {}
+
+    def increment(self, name: str, amount: int = 1):
+        """Increments a counter, creating it if needed
+
+        Args:
+            name (str): The name of the counter
+            amount (int, optional): How much to increment the counter by. Defaults to 1.
+        """
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def register_provider(self, name: str, provider: Callable[[], dict]):
+        """Registers a statistics provider, which is called every time a snapshot is taken
+
+        Args:
+            name (str): The section name the statistics are reported under
+            provider (Callable[[], dict]): Function returning the current statistics
+        """
+        self.providers[name] = provider
+
+    def snapshot(self) -> dict:
+        """Returns the current value of every counter and provider
+
+        Returns:
+            dict: The collected metrics
+        """
+        data: dict = {"counters": dict(self.counters)}
+        for name, provider in self.providers.items():
+            try:
+                data[name] = provider()
+            except Exception as e:
+                data[name] = {"error": str(e)}
+        return data
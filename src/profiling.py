@@ -0,0 +1,197 @@
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Deque, Dict
+
+
+class SlowCallbackHandler(logging.Handler):
+    """Captures the slow callback warnings asyncio logs in debug mode"""
+
+    def __init__(self, profiler: "Profiler"):
+        super().__init__(level=logging.WARNING)
+        self.profiler = profiler
+
+    def emit(self, record: logging.LogRecord):
+        message = record.getMessage()
+        if message.startswith("Executing"):
+            self.profiler.slow_callbacks.append(f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {message}")
+
+
+class Profiler():
+    """Opt-in profiling for the event loop. Everything is disabled by default and can be toggled at runtime:
+    - Handler timings: wall time spent in every function decorated with timed()
+    - Slow callback detection: asyncio debug mode, reporting callbacks that block the loop for longer than a threshold
+    - Sampling profiler: a background thread sampling the event loop's stack, dumpable as collapsed stacks for flame graphs
+    """
+
+    def __init__(self):
+        self.enabled = False  # Handler timings
+        self.handler_timings: Dict[str, list] = {}  # name -> [calls, total seconds, max seconds]
+
+        self.detect_slow_callbacks = False
+        self.slow_callback_threshold = 0.1  # Seconds
+        self.slow_callbacks: Deque[str] = deque(maxlen=100)
+        self.slow_callback_handler = SlowCallbackHandler(self)
+        self.loop: asyncio.AbstractEventLoop | None = None
+
+        self.sampling = False
+        self.sample_interval = 0.005  # Seconds
+        self.samples: Counter[str] = Counter()
+        self.sampler_thread: threading.Thread | None = None
+        self.loop_thread_id: int | None = None
+
+    # region - Handler timings
+
+    def timed(self, name: str):
+        """Decorator recording the wall time of each call to the decorated function (or coroutine) while handler timings are enabled
+
+        Args:
+            name (str): The name the timings are reported under
+        """
+
+        def decorator(func):
+            if inspect.iscoroutinefunction(func):
+
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await func(*args, **kwargs)
+                    start = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        self.record(name, time.perf_counter() - start)
+
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+
+            return wrapper
+
+        return decorator
+
+    def record(self, name: str, seconds: float):
+        timing = self.handler_timings.setdefault(name, [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += seconds
+        timing[2] = max(timing[2], seconds)
+
+    # endregion
+
+    # region - Slow callbacks
+
+    def set_slow_callback_detection(self, enabled: bool):
+        """Enables or disables asyncio's slow callback detection. Must be called from the event loop thread.
+
+        Args:
+            enabled (bool): Whether slow callbacks should be reported
+        """
+        self.detect_slow_callbacks = enabled
+        self.loop = asyncio.get_running_loop()
+        asyncio_logger = logging.getLogger("asyncio")
+
+        if enabled:
+            self.loop.set_debug(True)
+            self.loop.slow_callback_duration = self.slow_callback_threshold
+            asyncio_logger.addHandler(self.slow_callback_handler)
+        else:
+            self.loop.set_debug(False)
+            asyncio_logger.removeHandler(self.slow_callback_handler)
+
+    def set_slow_callback_threshold(self, threshold: float):
+        self.slow_callback_threshold = threshold
+        if self.detect_slow_callbacks and self.loop is not None:
+            self.loop.slow_callback_duration = threshold
+
+    # endregion
+
+    # region - Sampling
+
+    def set_sampling(self, enabled: bool):
+        """Starts or stops the sampling profiler. Must be called from the event loop thread, which is the thread being sampled.
+
+        Args:
+            enabled (bool): Whether the event loop should be sampled
+        """
+        if enabled == self.sampling:
+            return
+
+        self.sampling = enabled
+        if enabled:
+            self.loop_thread_id = threading.get_ident()
+            self.sampler_thread = threading.Thread(target=self.sample_loop, name="profiler-sampler", daemon=True)
+            self.sampler_thread.start()
+        elif self.sampler_thread is not None:
+            self.sampler_thread.join()
+            self.sampler_thread = None
+
+    def sample_loop(self):
+        while self.sampling:
+            frame = sys._current_frames().get(self.loop_thread_id)  # type: ignore
+
+            stack = []
+            while frame is not None:
+                stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+
+            if len(stack) > 0:
+                self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.sample_interval)
+
+    # endregion
+
+    def get_stats(self) -> dict:
+        return {
+            "handlers": {
+                name: {"calls": calls, "total_ms": round(total * 1000, 2), "mean_ms": round(total / calls * 1000, 2), "max_ms": round(maximum * 1000, 2)}
+                for name, (calls, total, maximum) in self.handler_timings.items()
+            },
+            "slow_callbacks": list(self.slow_callbacks),
+            "samples": sum(self.samples.values()),
+        }
+
+    def dump(self, directory: str) -> str:
+        """Dumps the collected samples in the collapsed stack format (flamegraph.pl, speedscope) and the handler timings as JSON
+
+        Args:
+            directory (str): The folder to write the profile to
+
+        Returns:
+            str: The path of the collapsed stack file
+        """
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        name = f"{directory}/profile-{time.strftime('%Y-%m-%d--%Hh-%Mm-%Ss', time.localtime())}"
+
+        with open(f"{name}.folded", "w") as file:
+            for stack, count in self.samples.items():
+                file.write(f"{stack} {count}\n")
+
+        with open(f"{name}.json", "w") as file:
+            json.dump(self.get_stats(), file, indent=2)
+
+        return f"{name}.folded"
+
+    def reset(self):
+        self.handler_timings.clear()
+        self.slow_callbacks.clear()
+        self.samples.clear()
+
+
+# Shared profiler, so handlers can be decorated where they are defined
+profiler = Profiler()
@@ -0,0 +1,126 @@
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Set
+
+import src.utils as utils
+
+
+class SearchIndex():
+    """An incremental inverted index over the chat messages and session logs. Every indexed entry is appended to a
+    JSON lines file next to the logs, so the index survives restarts without rescanning the CSV logs.
+    Searches return the entries containing every word of the query, across all sessions.
+    """
+
+    TOKEN_PATTERN = re.compile(r"\w+")
+
+    def __init__(self, index_path: str = utils.search_index_path):
+        self.index_path = index_path
+
+        self.documents: List[dict] = []
+        self.postings: Dict[str, Set[int]] = {}
+
+        self.session = ""  # The session new entries are attributed to, set by the logger
+        self.index_file = None
+
+    def tokenize(self, text: str) -> List[str]:
+        return self.TOKEN_PATTERN.findall(text.lower())
+
+    # region - Persistence
+
+    def load(self):
+        """Loads the persisted index. On the first run, the index is built from the existing CSV logs instead."""
+
+        if not Path(utils.log_path).exists():
+            os.mkdir(utils.log_path)
+
+        backfill = not Path(self.index_path).exists()
+        if not backfill:
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    if line.strip() == "":
+                        continue
+                    try:
+                        self.index_document(json.loads(line))
+                    except json.JSONDecodeError:
+                        print(f"Skipping corrupted search index entry: {line[:40]}")
+
+        self.index_file = open(self.index_path, "a", encoding="utf-8")
+
+        if backfill:
+            self.backfill_from_logs()
+
+    def backfill_from_logs(self):
+        """Indexes the content of every existing CSV log file"""
+
+        for log in sorted(Path(utils.log_path).glob("*.csv")):
+            with open(log, "r", encoding="utf-8", errors="replace") as file:
+                for line in file:
+                    if line.strip() != "":
+                        self.add_document("log", line.rstrip("\n"), session=log.stem, timestamp="")
+
+    def close(self):
+        if self.index_file is not None:
+            self.index_file.close()
+            self.index_file = None
+
+    # endregion
+
+    # region - Indexing
+
+    def add_document(self, sender: str, content: str, session: str | None = None, timestamp: str | None = None):
+        """Adds an entry to the index and persists it
+
+        Args:
+            sender (str): Who sent the message ("user", "server", ...), or "log" for log file entries
+            content (str): The text to index
+            session (str, optional): The session the entry belongs to. Defaults to the current session.
+            timestamp (str, optional): When the entry was created. Defaults to now.
+        """
+        document = {
+            "session": self.session if session is None else session,
+            "sender": sender,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()) if timestamp is None else timestamp,
+            "content": content,
+        }
+        self.index_document(document)
+
+        if self.index_file is not None:
+            self.index_file.write(json.dumps(document) + "\n")
+            self.index_file.flush()
+
+    def index_document(self, document: dict):
+        doc_id = len(self.documents)
+        self.documents.append(document)
+
+        text = f"{document['session']} {document['sender']} {document['timestamp']} {document['content']}"
+        for token in set(self.tokenize(text)):
+            self.postings.setdefault(token, set()).add(doc_id)
+
+    # endregion
+
+    def search(self, query: str, limit: int = 50) -> List[dict]:
+        """Returns the most recent entries containing every word of the query
+
+        Args:
+            query (str): The words to search for, matched against the content, sender, timestamp and session name
+            limit (int, optional): Maximum amount of results. Defaults to 50.
+
+        Returns:
+            List[dict]: The matching entries, newest first
+        """
+        tokens = set(self.tokenize(query))
+        if len(tokens) == 0:
+            return []
+
+        # Intersect starting from the rarest word, so the candidate set stays small
+        candidates = sorted((self.postings.get(token, set()) for token in tokens), key=len)
+        matches = set(candidates[0])
+        for posting in candidates[1:]:
+            matches &= posting
+            if len(matches) == 0:
+                break
+
+        return [self.documents[doc_id] for doc_id in sorted(matches, reverse=True)[:limit]]
@@ -0,0 +1,86 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import src.utils as utils
+from src.webcam import WebcamFrameHeader
+
+# Sinks receive the websocket events in headless mode. None of them depend on nicegui.
+
+
+class Sink():
+    """Base class for the headless sinks, override the events you are interested in"""
+
+    def on_open(self, websocket_type: str, resumed: bool):
+        pass
+
+    def on_close(self, websocket_type: str):
+        pass
+
+    def on_session_end(self):
+        pass
+
+    async def on_message(self, header: str, payload: bytes):
+        pass
+
+    async def on_frame(self, header: WebcamFrameHeader | None, frame: bytes):
+        pass
+
+
+class LoggerSink(Sink):
+    """Writes the chat messages of each session to a CSV log, like the dashboard does"""
+
+    def __init__(self, logger: utils.Logger):
+        self.logger = logger
+
+    def on_open(self, websocket_type: str, resumed: bool):
+        if websocket_type == "comms" and not resumed:
+            self.logger.create_new_log()
+
+    def on_session_end(self):
+        self.logger.close_logs()
+
+    async def on_message(self, header: str, payload: bytes):
+        if header == utils.MessageTypes.MESSAGE_TYPE:
+            message = json.loads(payload.decode("utf-8"))
+            self.logger.write_to_file(f"{utils.get_current_time_formatted()};{message['sender']};{message['content']}")
+
+
+class RecorderSink(Sink):
+    """Saves every webcam frame as is (no decoding), one folder per webcam connection"""
+
+    def __init__(self, directory: str = utils.media_path_recordings):
+        self.directory = directory
+        self.recording_path: Path | None = None
+        self.frame_count = 0
+
+    def on_open(self, websocket_type: str, resumed: bool):
+        if websocket_type == "webcam":
+            self.recording_path = Path(f"{self.directory}/{utils.get_current_date_formatted()}--{utils.get_current_time_formatted()}")
+            self.recording_path.mkdir(parents=True, exist_ok=True)
+            self.frame_count = 0
+
+    async def on_frame(self, header: WebcamFrameHeader | None, frame: bytes):
+        if self.recording_path is None:
+            return
+
+        self.frame_count += 1
+        index = header.sequence if header is not None else self.frame_count
+        await asyncio.to_thread((self.recording_path / f"{index:08d}.jpg").write_bytes, frame)
+
+
+class CallbackSink(Sink):
+    """Forwards messages and frames to your own functions"""
+
+    def __init__(self, on_message: Callable[[str, bytes], Awaitable] | None = None, on_frame: Callable[[WebcamFrameHeader | None, bytes], Awaitable] | None = None):
+        self.message_callback = on_message
+        self.frame_callback = on_frame
+
+    async def on_message(self, header: str, payload: bytes):
+        if self.message_callback is not None:
+            await self.message_callback(header, payload)
+
+    async def on_frame(self, header: WebcamFrameHeader | None, frame: bytes):
+        if self.frame_callback is not None:
+            await self.frame_callback(header, frame)
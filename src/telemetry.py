@@ -0,0 +1,217 @@
+import asyncio
+import math
+import time
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, List
+
+
+class RingBuffer():
+    """A fixed-size ring buffer of floats, backed by an array so it never grows or allocates per sample"""
+
+    def __init__(self, capacity: int):
+        self.values = array("d", [0.0] * capacity)
+        self.capacity = capacity
+        self.start = 0
+        self.count = 0
+
+    def append(self, value: float):
+        self.values[(self.start + self.count) % self.capacity] = value
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def to_list(self, offset: int = 0) -> List[float]:
+        """Returns the values, oldest first
+
+        Args:
+            offset (int, optional): Skips this many of the oldest values. Defaults to 0.
+        """
+        count = self.count - offset
+        if count <= 0:
+            return []
+
+        first = (self.start + offset) % self.capacity
+        end = first + count
+        if end <= self.capacity:
+            return self.values[first:end].tolist()
+        return self.values[first:].tolist() + self.values[0:end - self.capacity].tolist()
+
+    def __len__(self):
+        return self.count
+
+
+class Telemetry():
+    """Samples the session statistics (message rate, frame rate, latencies, queue depths) at a fixed interval into ring buffers,
+    so recent history can be charted on the dashboard and exported as images when the session ends.
+    """
+
+    # Series drawn together in each exported chart: chart name -> (y axis label, series)
+    CHARTS = {
+        "rates": ("per second / count", ["message_rate", "frame_rate", "queue_depth"]),
+        "latency": ("milliseconds", ["capture_to_receive", "receive_to_decode", "decode_to_browser"]),
+    }
+
+    def __init__(self, capacity: int = 600, interval: float = 1.0):
+        self.capacity = capacity
+        self.interval = interval
+
+        self.timestamps = RingBuffer(capacity)
+        self.series: Dict[str, RingBuffer] = {}
+        self.sources: Dict[str, Callable[[], float | None]] = {}
+        self.counters: Dict[str, tuple[float, float]] = {}  # Rate series -> (last counter value, last sample time)
+
+        self.sample_count = 0  # Samples taken since startup, the index of the next sample
+        self.version = 0  # Incremented when a sampled value changes, so charts are only updated when there is new data
+        self.last_values: Dict[str, float] = {}
+
+        # Every sample of the current session, for the export. Kept apart from the ring buffers so long sessions keep their start
+        self.session_start = 0  # Sample index the current session started at
+        self.session_timestamps = array("d")
+        self.session_series: Dict[str, array] = {}
+        self.rendered_key: tuple | None = None  # (version, session start, directory, name) of the last export
+        self.rendered_paths: List[str] = []
+
+    def add_series(self, name: str, source: Callable[[], float | None]):
+        """Adds a series sampled from a function returning its current value (None if unavailable)"""
+        self.series[name] = RingBuffer(self.capacity)
+        self.session_series[name] = array("d")
+        self.sources[name] = source
+
+    def add_rate(self, name: str, counter: Callable[[], float]):
+        """Adds a series with the per second rate of a counter that only increases"""
+        self.counters[name] = (counter(), time.time())
+
+        def rate() -> float:
+            value, now = counter(), time.time()
+            last_value, last_time = self.counters[name]
+            self.counters[name] = (value, now)
+            return (value - last_value) / (now - last_time) if now > last_time else 0.0
+
+        self.add_series(name, rate)
+
+    def sample(self):
+        now = time.time()
+        self.timestamps.append(now)
+        self.session_timestamps.append(now)
+        self.sample_count += 1
+
+        changed = False
+        for name, source in self.sources.items():
+            try:
+                value = source()
+            except Exception:
+                value = None
+            value = math.nan if value is None else value
+            self.series[name].append(value)
+            self.session_series[name].append(value)
+
+            last_value = self.last_values.get(name)
+            if last_value is None or not (value == last_value or (math.isnan(value) and math.isnan(last_value))):
+                changed = True
+            self.last_values[name] = value
+
+        if changed:
+            self.version += 1
+
+    def start_session(self):
+        """Marks the start of a new session, the export only covers the samples taken from now on"""
+        self.session_start = self.sample_count
+        self.session_timestamps = array("d")
+        self.session_series = {name: array("d") for name in self.series}
+        self.version += 1
+
+    def start(self):
+        """Starts sampling in the background, must be called from the event loop"""
+        asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.sample()
+
+    def get_points(self, name: str, since: int = 0) -> List[list]:
+        """Returns a series as [timestamp (ms), value] pairs, skipping missing values
+
+        Args:
+            name (str): The series name
+            since (int, optional): Only returns the samples taken from this sample index on (see sample_count). Defaults to 0.
+        """
+        offset = max(0, since - (self.sample_count - len(self.timestamps)))
+        return [[timestamp * 1000, value] for timestamp, value in zip(self.timestamps.to_list(offset), self.series[name].to_list(offset)) if not math.isnan(value)]
+
+    # region - Export
+
+    def render(self, directory: str, name: str, timestamps: List[float], series: Dict[str, List[float]]) -> List[str]:
+        """Renders every chart as a PNG image. Blocking, use export() from the event loop.
+
+        Args:
+            directory (str): The folder to save the images to
+            name (str): Prefix of the image names, e.g. the session name
+            timestamps (List[float]): Snapshot of the sample times
+            series (Dict[str, List[float]]): Snapshot of the series values
+
+        Returns:
+            List[str]: The paths of the images
+        """
+        try:
+            # The Figure API doesn't touch pyplot's global state, so concurrent exports from worker threads are safe
+            from matplotlib.figure import Figure
+        except ImportError:
+            print("matplotlib is not installed, telemetry charts can't be exported.")
+            return []
+
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        elapsed = [timestamp - timestamps[0] for timestamp in timestamps]
+
+        paths = []
+        for chart, (label, names) in self.CHARTS.items():
+            figure = Figure(figsize=(10, 4))
+            axes = figure.subplots()
+            for series_name in names:
+                if series_name in series:
+                    axes.plot(elapsed, series[series_name], label=series_name.replace("_", " "))
+            axes.set_xlabel("seconds")
+            axes.set_ylabel(label)
+            axes.legend(loc="upper left")
+            axes.grid(alpha=0.3)
+
+            path = f"{directory}/{name}-{chart}.png"
+            figure.savefig(path, dpi=100, bbox_inches="tight")
+            paths.append(path)
+
+        return paths
+
+    def export(self, directory: str, name: str) -> asyncio.Future:
+        """Renders the charts of the current session off the event loop. The images are reused while no new data arrives.
+        The samples are copied right away, so a new session can start before the rendering finishes.
+
+        Args:
+            directory (str): The folder to save the images to
+            name (str): Prefix of the image names, e.g. the session name
+
+        Returns:
+            asyncio.Future: Resolves to the paths of the images
+        """
+        loop = asyncio.get_running_loop()
+
+        key = (self.version, self.session_start, directory, name)
+        if self.rendered_key == key or len(self.session_timestamps) == 0:
+            cached = loop.create_future()
+            cached.set_result(self.rendered_paths)
+            return cached
+
+        timestamps = self.session_timestamps.tolist()
+        series = {series_name: values.tolist() for series_name, values in self.session_series.items()}
+
+        def store(task: asyncio.Future):
+            if not task.cancelled() and task.exception() is None:
+                self.rendered_key = key
+                self.rendered_paths = task.result()
+
+        task = loop.create_task(asyncio.to_thread(self.render, directory, name, timestamps, series))
+        task.add_done_callback(store)
+        return task
+
+    # endregion
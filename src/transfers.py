@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict
+
+import src.utils as utils
+
+# Transfer message layout, after the message header: operation (B = begin, D = data, E = end), transfer id (padded with #), then
+#   B: JSON {"name": str, "kind": str, "size": int}
+#   D: offset (uint64, little endian) followed by the chunk bytes
+#   E: SHA-256 of the whole payload, as 64 hex characters
+TRANSFER_PREFIX = struct.Struct(f"<c{utils.TRANSFER_ID_LENGTH}s")
+TRANSFER_OFFSET = struct.Struct("<Q")
+
+
+class Transfer():
+    """A payload being received in chunks, spooled in memory and moved to a temporary file once it grows too large"""
+
+    def __init__(self, transfer_id: str, name: str, kind: str, size: int):
+        self.transfer_id = transfer_id
+        self.name = name
+        self.kind = kind  # A message type (e.g. MSG_SYNC) to process the payload as that message, anything else is saved as a file
+        self.size = size
+
+        self.file = tempfile.SpooledTemporaryFile(max_size=utils.TRANSFER_SPOOL_SIZE)
+        self.received = 0  # Bytes received contiguously from the start, re-sent or overlapping chunks aren't counted twice
+        self.pending: Dict[int, int] = {}  # Chunks received past a gap, offset -> end
+        self.started_at = time.time()
+
+    def write(self, offset: int, chunk: bytes) -> bool:
+        """Writes a chunk, returning False if it falls outside the declared size"""
+        end = offset + len(chunk)
+        if end > self.size:
+            return False
+
+        if end > utils.TRANSFER_SPOOL_SIZE:
+            self.file.rollover()  # Moves to disk before seeking, so a far offset never pads the in-memory buffer
+
+        self.file.seek(offset)
+        self.file.write(chunk)
+
+        if offset > self.received:
+            self.pending[offset] = max(end, self.pending.get(offset, 0))
+            return True
+
+        self.received = max(self.received, end)
+        for pending_offset in sorted(self.pending):
+            if pending_offset > self.received:
+                break
+            self.received = max(self.received, self.pending.pop(pending_offset))
+        return True
+
+    def get_checksum(self) -> str:
+        sha = hashlib.sha256()
+        self.file.seek(0)
+        for block in iter(lambda: self.file.read(1024 * 1024), b""):
+            sha.update(block)
+        self.file.seek(0)
+        return sha.hexdigest()
+
+    def get_progress(self) -> float:
+        return min(1.0, self.received / self.size) if self.size > 0 else 0.0
+
+    def close(self):
+        self.file.close()
+
+
+class TransferManager():
+    """Reassembles payloads larger than a single websocket message from TRANSFER messages, verifying their checksum before
+    handing them over to the completion handler.
+    """
+
+    def __init__(self, on_complete: Callable[[Transfer], Awaitable]):
+        self.on_complete = on_complete
+        self.transfers: Dict[str, Transfer] = {}
+
+    async def handle_message(self, payload: bytes):
+        """Handles a TRANSFER message
+
+        Args:
+            payload (bytes): The message without its header
+        """
+        operation, transfer_id = TRANSFER_PREFIX.unpack_from(payload)
+        transfer_id = transfer_id.decode("utf-8").replace("#", "")
+        body = payload[TRANSFER_PREFIX.size:]
+
+        if operation == b"B":
+            self.begin(transfer_id, json.loads(body.decode("utf-8")))
+        elif operation == b"D":
+            self.write_chunk(transfer_id, body)
+        elif operation == b"E":
+            await self.end(transfer_id, body.decode("utf-8"))
+        else:
+            print(f"Error: Unknown transfer operation {operation} for transfer {transfer_id}!")
+
+    def begin(self, transfer_id: str, info: dict):
+        if transfer_id in self.transfers:
+            self.cancel(transfer_id)
+
+        self.transfers[transfer_id] = Transfer(transfer_id, info.get("name", transfer_id), info.get("kind", "file"), int(info.get("size", 0)))
+
+    def write_chunk(self, transfer_id: str, body: bytes):
+        transfer = self.transfers.get(transfer_id)
+        if transfer is None:
+            print(f"Error: Received a chunk for unknown transfer {transfer_id}!")
+            return
+
+        (offset,) = TRANSFER_OFFSET.unpack_from(body)
+        if not transfer.write(offset, body[TRANSFER_OFFSET.size:]):
+            # Seeking past the declared size would pad the spooled buffer in memory, a corrupt offset could exhaust it
+            print(f"Error: Chunk at offset {offset} exceeds the size of transfer {transfer.name} ({transfer.size} bytes), cancelling it.")
+            self.cancel(transfer_id)
+
+    async def end(self, transfer_id: str, checksum: str):
+        transfer = self.transfers.pop(transfer_id, None)
+        if transfer is None:
+            print(f"Error: Received the end of unknown transfer {transfer_id}!")
+            return
+
+        try:
+            if transfer.received < transfer.size:
+                print(f"Error: Transfer {transfer.name} ({transfer_id}) ended with {transfer.size - transfer.received} bytes missing, discarding it.")
+                return
+
+            # Hashing a large payload would block the event loop
+            received_checksum = await asyncio.to_thread(transfer.get_checksum)
+            if received_checksum != checksum.strip().lower():
+                print(f"Error: Checksum mismatch for transfer {transfer.name} ({transfer_id}), discarding it.")
+                return
+
+            await self.on_complete(transfer)
+        finally:
+            transfer.close()
+
+    def cancel(self, transfer_id: str):
+        transfer = self.transfers.pop(transfer_id, None)
+        if transfer is not None:
+            transfer.close()
+
+    def cancel_all(self):
+        for transfer_id in list(self.transfers):
+            self.cancel(transfer_id)
+
+    def get_progress(self) -> list[dict]:
+        return [
+            {"id": transfer.transfer_id, "name": transfer.name, "kind": transfer.kind, "size": transfer.size, "received": transfer.received, "progress": transfer.get_progress()}
+            for transfer in self.transfers.values()
+        ]
+
+
+def save_transfer(transfer: Transfer, directory: str = utils.media_path_transfers) -> str:
+    """Copies a completed transfer to a folder, returning its path. Blocking, run it in a thread for large payloads.
+
+    Args:
+        transfer (Transfer): The completed transfer
+        directory (str, optional): The destination folder. Defaults to utils.media_path_transfers.
+
+    Returns:
+        str: The path of the saved file
+    """
+    Path(directory).mkdir(parents=True, exist_ok=True)
+
+    # Prefixed like the logs and recordings, so transfers sharing a name (e.g. a recurring screenshot.png) don't overwrite each other
+    transfer_id = os.path.basename(transfer.transfer_id)
+    name = os.path.basename(transfer.name) or transfer_id
+    path = f"{directory}/{utils.get_current_date_formatted()}--{utils.get_current_time_formatted()}--{transfer_id}--{name}"
+
+    transfer.file.seek(0)
+    with open(path, "wb") as file:
+        shutil.copyfileobj(transfer.file, file)
+    return path
@@ -1,7 +1,9 @@
 import socket
 import os
+import functools
 from pathlib import Path
 import time
+from src.profiling import profiler
 
 #Ports to use
 WEBSOCKET_WEBCAM_PORT = 5000
@@ -9,11 +11,25 @@ WEBSOCKET_COMMS_PORT = 5001
 WEBSOCKET_MSG_SIZE = 4 * 1024 * 1024
 HEADER_LENGTH = 8
 
+#Session resume, a comms reconnect within the grace period reattaches to the same session
+SESSION_RESUME_GRACE_PERIOD = 30 #Seconds
+SESSION_BUFFER_SIZE = 256 #Maximum amount of outbound messages buffered while disconnected
+
+#Chunked transfers, for payloads larger than a single websocket message
+TRANSFER_ID_LENGTH = 32
+TRANSFER_SPOOL_SIZE = 8 * 1024 * 1024 #Transfers larger than this are spooled to a temporary file instead of memory
+
 #Directories, assumes everything is local ./
 script_dir = "."
 media_path = script_dir + "/Media"
 log_path = script_dir + "/WebappLogs"
 media_path_graphs = script_dir + "/Media/graphs"
+media_path_transfers = script_dir + "/Media/transfers"
+media_path_recordings = script_dir + "/Media/recordings"
+search_index_path = log_path + "/search_index.jsonl"
+canned_responses_path = script_dir + "/canned_responses.json"
+profile_path = log_path + "/profiles"
+settings_path = script_dir + "/settings.cfg"
 
 
 
@@ -25,6 +41,20 @@ class MessageTypes:
     
     MESSAGE_TYPE = "M" #Represents a text message
     MESSAGE_SYNC = "MSG_SYNC" #Represents a message sync, where unity and the dashboard exchange the message logs
+    SESSION = "SESSION" #Sent on connect, carries the resume token unity passes back when reconnecting (ws://address:port/?resume=token)
+    TRANSFER = "XFER" #A chunk of a large payload, see transfers.py for the layout
+
+
+#Inbound comms queues, message type -> (priority, concurrency). Higher priorities are processed first, a concurrency of 1 keeps messages of that type in order.
+#The message sync replaces the whole log, so it goes before the messages that follow it
+INBOUND_QUEUES = {
+    MessageTypes.MESSAGE_SYNC: (20, 1),
+    MessageTypes.MESSAGE_TYPE: (10, 1),
+    MessageTypes.TRANSFER: (5, 1), #Chunks must stay in order, and bulk data shouldn't delay the chat
+}
+INBOUND_DEFAULT_QUEUE = (0, 1) #Message types not listed above
+INBOUND_MAX_CONCURRENCY = 4 #Messages processed at once, across all types
+INBOUND_QUEUE_SIZE = 1024 #Messages waiting per type before the websocket stops being read
 
 
 class StylingHelper():
@@ -56,8 +86,13 @@ class StylingHelper():
 def generate_padding(len : int):
     return '#'*len
 
+def get_header(data) -> str:
+    """Returns the message type of a received message, the first HEADER_LENGTH bytes without the padding"""
+    return data[0:HEADER_LENGTH].decode("utf-8").replace("#","")
+
+@functools.cache
 def get_ip():
-    """Returns your current IP address to use in the hosting address for nicegui
+    """Returns your current IP address to use in the hosting address for nicegui. Resolved once, the result is cached
 
     Returns:
         str: Your current local public IP address
@@ -78,13 +113,17 @@ class Logger():
     """A logger that automatically runs on each websocket connection.
     """
     
-    def __init__(self):
+    def __init__(self, search_index = None):
         self.log_file = None   
+        self.search_index = search_index # Optional SearchIndex, every line written to the log is also indexed
     
     def create_new_log(self):
         self.current_time = f"{get_current_date_formatted()}--{get_current_time_formatted()}"
         self.open_file()
         
+        if(self.search_index is not None):
+            self.search_index.session = self.current_time
+        
     def close_logs(self):
         if(self.log_file is not None):
             self.log_file.close()
@@ -103,6 +142,7 @@ class Logger():
         
         
     
+    @profiler.timed("logger.write_to_file")
     def write_to_file(self,content : str):
         """Writes a string to the log file, assuming it is already opened.
 
@@ -115,6 +155,9 @@ class Logger():
         self.log_file.write(f"{content}\n")
         self.log_file.flush()
         
+        if(self.search_index is not None):
+            self.search_index.add_document("log", content)
+        
         
 def get_current_time_formatted():
     return time.strftime("%Hh-%Mm-%Ss", time.localtime())
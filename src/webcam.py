@@ -0,0 +1,179 @@
+import hashlib
+import io
+import struct
+from collections import deque
+from typing import Deque, Dict
+
+# Webcam frame header: magic, version, header length, sequence number, capture timestamp (microseconds since the unix epoch).
+# The header length lets older servers skip the fields added by newer header versions.
+# Legacy frames start with a single byte followed by the JPEG data (0xFF 0xD8), so they never match the magic.
+WEBCAM_HEADER = struct.Struct("<2sBBIQ")
+WEBCAM_HEADER_MAGIC = b"WF"
+WEBCAM_HEADER_VERSION = 1
+
+
+class WebcamFrameHeader():
+    """The timing information sent along with each webcam frame"""
+
+    def __init__(self, version: int, sequence: int, capture_time: float):
+        self.version = version
+        self.sequence = sequence
+        self.capture_time = capture_time  # Seconds since the unix epoch, 0 if unknown
+
+
+def parse_webcam_frame(data: bytes) -> tuple[WebcamFrameHeader | None, bytes]:
+    """Splits a webcam message into its header and the encoded frame
+
+    Args:
+        data (bytes): The webcam message as received
+
+    Returns:
+        tuple[WebcamFrameHeader | None, bytes]: The header (None for legacy frames without one) and the frame data
+
+    Raises:
+        ValueError: If the header is malformed, the frame should be dropped
+    """
+    if len(data) >= WEBCAM_HEADER.size and data[0:2] == WEBCAM_HEADER_MAGIC:
+        _, version, header_length, sequence, capture_time = WEBCAM_HEADER.unpack_from(data)
+
+        # Newer versions may append fields (skipped through the header length), but never shrink the header
+        if version < 1:
+            raise ValueError(f"unknown header version {version}")
+        if header_length < WEBCAM_HEADER.size or header_length >= len(data):
+            raise ValueError(f"header length {header_length} is out of bounds for a {len(data)} bytes frame")
+
+        return WebcamFrameHeader(version, sequence, capture_time / 1_000_000), data[header_length:]
+
+    return None, data[1:]  # Legacy frames, the first byte carries no information
+
+
+class LatencyTracker():
+    """Keeps a rolling window of latency samples for each stage of the webcam pipeline, and counts sequence gaps (dropped frames)"""
+
+    STAGES = ("capture_to_receive", "receive_to_decode", "decode_to_browser")
+
+    def __init__(self, window: int = 512):
+        self.samples: Dict[str, Deque[float]] = {stage: deque(maxlen=window) for stage in self.STAGES}
+
+        self.last_sequence: int | None = None
+        self.sequence_gaps = 0
+        self.malformed_frames = 0  # Frames dropped because of an invalid header
+
+    def record(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+
+    def record_sequence(self, sequence: int):
+        """Registers a received sequence number, counting the frames missing since the last one"""
+        if self.last_sequence is not None and sequence > self.last_sequence + 1:
+            self.sequence_gaps += sequence - self.last_sequence - 1
+        self.last_sequence = sequence  # Lower numbers mean unity restarted the stream
+
+    def record_malformed(self):
+        self.malformed_frames += 1
+
+    def get_percentiles(self, stage: str) -> dict:
+        """Returns the p50/p95/p99 of a stage in milliseconds, None if there are no samples yet"""
+        samples = sorted(self.samples[stage])
+        if len(samples) == 0:
+            return {"p50": None, "p95": None, "p99": None}
+
+        def percentile(p: int) -> float:
+            return round(samples[min(len(samples) - 1, round(p / 100 * (len(samples) - 1)))] * 1000, 2)
+
+        return {"p50": percentile(50), "p95": percentile(95), "p99": percentile(99)}
+
+    def reset(self):
+        """Resets the sequence tracking, for a new webcam connection"""
+        self.last_sequence = None
+
+    def get_stats(self) -> dict:
+        stats: dict = {stage: self.get_percentiles(stage) for stage in self.STAGES}
+        stats["sequence_gaps"] = self.sequence_gaps
+        stats["malformed_frames"] = self.malformed_frames
+        return stats
+
+
+class FrameChangeDetector():
+    """Detects whether an incoming webcam frame differs from the last one displayed, so static frames can skip
+    the decode, resize and browser push. Exact duplicates are found with a fast hash of the raw bytes, and near
+    duplicates (e.g. compression noise on a static camera) with an optional perceptual diff of a small grayscale thumbnail.
+    """
+
+    def __init__(self, thumbnail_size: tuple[int, int] = (16, 16)):
+        self.thumbnail_size = thumbnail_size
+
+        self.last_hash = None
+        self.last_thumbnail = None
+
+        # Statistics
+        self.frames_received = 0
+        self.frames_skipped = 0
+
+    def has_changed(self, frame: bytes, threshold: float = 0.0) -> bool:
+        """Checks if a frame has changed since the last frame that was reported as changed
+
+        Args:
+            frame (bytes): The raw (encoded) frame
+            threshold (float, optional): Mean pixel difference (0-1) below which a frame counts as unchanged. 0 disables the perceptual diff. Defaults to 0.0.
+
+        Returns:
+            bool: True if the frame should be displayed, False if it can be skipped
+        """
+        self.frames_received += 1
+
+        frame_hash = hashlib.blake2b(frame, digest_size=16).digest()
+        if frame_hash == self.last_hash:
+            self.frames_skipped += 1
+            return False
+        self.last_hash = frame_hash
+
+        if threshold <= 0:
+            self.last_thumbnail = None
+            return True
+
+        thumbnail = self.get_thumbnail(frame)
+        if thumbnail is not None and self.last_thumbnail is not None:
+            if self.get_difference(thumbnail, self.last_thumbnail) < threshold:
+                # We keep comparing against the last displayed frame, so slow drifts still get displayed eventually
+                self.frames_skipped += 1
+                return False
+
+        self.last_thumbnail = thumbnail
+        return True
+
+    def get_thumbnail(self, frame: bytes):
+        """Decodes a small grayscale version of the frame. For JPEG frames the decoder scales down while decoding, which is much cheaper than a full decode.
+
+        Args:
+            frame (bytes): The raw (encoded) frame
+
+        Returns:
+            Image | None: The thumbnail, or None if the frame could not be decoded
+        """
+        from PIL import Image
+
+        try:
+            image = Image.open(io.BytesIO(frame))
+            image.draft("L", self.thumbnail_size)
+            return image.convert("L").resize(self.thumbnail_size)
+        except Exception:
+            return None
+
+    def get_difference(self, first, second) -> float:
+        """Returns the mean absolute pixel difference between two thumbnails, normalized between 0 and 1"""
+        from PIL import ImageChops, ImageStat
+
+        difference = ImageChops.difference(first, second)
+        return ImageStat.Stat(difference).mean[0] / 255
+
+    def reset(self):
+        """Forgets the last frame, so the next frame is always reported as changed (e.g. after a reconnect or page reload)"""
+        self.last_hash = None
+        self.last_thumbnail = None
+
+    def get_stats(self) -> dict:
+        return {
+            "frames_received": self.frames_received,
+            "frames_skipped": self.frames_skipped,
+            "skip_rate": self.frames_skipped / self.frames_received if self.frames_received > 0 else 0.0,
+        }
@@ -1,7 +1,13 @@
 #Websockets
 import asyncio
-from typing import Set
+import secrets
+from collections import deque
+from typing import Deque, Set
+from urllib.parse import parse_qs, urlsplit
 import src.utils as utils
+from src.config import TransportConfig, get_config
+from src.dispatcher import InboundDispatcher
+from src.profiling import profiler
 from pathlib import Path
 import websockets
 from websockets.server import WebSocketServerProtocol # type: ignore
@@ -13,8 +19,15 @@ class Websocket():
     
     
     def __init__(self):
+        self.config = get_config()
+        
         self.WEBCAM_CONNECTIONS: Set[WebSocketServerProtocol] = set()
         self.COMMUNICATION_CONNECTIONS: Set[WebSocketServerProtocol] = set()
+        
+        # Comms session, kept alive for a grace period after a disconnect so a reconnect can resume it
+        self.session_token: str | None = None
+        self.session_expiry: asyncio.TimerHandle | None = None
+        self.pending_messages: Deque[str] = deque(maxlen=self.config.session_buffer_size)
     
     def setup_application(self, app):
         """Configures the application.
@@ -24,6 +37,10 @@ class Websocket():
         """
         self.app = app
         
+        # Incoming comms messages are queued per message type and processed by priority, so slow handlers don't stall the receive loop
+        self.dispatcher = InboundDispatcher(app.process_input, self.config.inbound_max_concurrency, self.config.inbound_queue_size)
+        self.config.on_reload(self.apply_config)
+        
     def get_connection(self, type : str) -> WebSocketServerProtocol | int: 
         """Returns a websocket connection
 
@@ -45,15 +62,35 @@ class Websocket():
     async def start_websocket_server(self):
         """Starts the websocket server
         """
-        ws_address = f"{utils.get_ip()}"
+        ws_address = self.config.host or utils.get_ip()
         print(f"\nWebsocket configured at: {ws_address}")
         
         self.save_websocket_config(ws_address)
         
         await asyncio.gather(
-            websockets.serve(self.handle_connect_comm, ws_address, utils.WEBSOCKET_COMMS_PORT,ping_timeout=5,ping_interval=5),
-            websockets.serve(self.handle_connect_webcam, ws_address, utils.WEBSOCKET_WEBCAM_PORT, max_size=utils.WEBSOCKET_MSG_SIZE,ping_timeout=5,ping_interval=5)
+            websockets.serve(
+                self.handle_connect_comm, ws_address, self.config.comms_port,
+                max_size=self.config.comms_max_message_size,
+                compression="deflate" if self.config.comms_compression else None,
+                ping_interval=self.config.ping_interval, ping_timeout=self.config.ping_timeout,
+                max_queue=self.config.max_queue, write_limit=self.config.write_limit,
+            ),
+            websockets.serve(
+                self.handle_connect_webcam, ws_address, self.config.webcam_port,
+                max_size=self.config.webcam_max_message_size,
+                compression="deflate" if self.config.webcam_compression else None,
+                ping_interval=self.config.ping_interval, ping_timeout=self.config.ping_timeout,
+                max_queue=self.config.max_queue, write_limit=self.config.write_limit,
+            )
         )
+        
+        # Applies the hot reloadable settings when settings.cfg changes
+        self.config_watcher = asyncio.get_running_loop().create_task(self.config.watch())
+        
+    def apply_config(self, config: TransportConfig):
+        """Applies hot reloaded settings to the running websockets
+        """
+        self.dispatcher.set_limits(config.inbound_max_concurrency, config.inbound_queue_size)
 
     async def handle_connect_webcam(self, websocket: WebSocketServerProtocol):
         """Registers the new websocket connections, handles incoming messages and remove the connection when it is closed."""
@@ -75,22 +112,97 @@ class Websocket():
         """Registers the new websocket connections, handles incoming messages and remove the connection when it is closed."""
         try:
             print("\n****COMMS CONNECTED****\n")
+            resumed = self.resume_session(self.get_resume_token(websocket))
+            if resumed:
+                self.drop_stale_connections()
             self.COMMUNICATION_CONNECTIONS.add(websocket)
-            self.app.handle_websocket_open("comms")
+            self.app.handle_websocket_open("comms", resumed=resumed)
+            
+            # Sent straight to this connection (not through send_content), so it can't go to a stale socket or show up in notifications
+            header = utils.MessageTypes.SESSION
+            await websocket.send(utils.generate_padding(utils.HEADER_LENGTH - len(header)) + header + str(self.session_token))
+            await self.send_pending_messages(websocket)
             
             async for data in websocket:
-                await self.app.process_input(data)
+                await self.dispatcher.submit(data)
                 
         finally:
             print("\n****COMMS DISCONNECTED****\n")
-            self.COMMUNICATION_CONNECTIONS.remove(websocket)
-            self.app.handle_websocket_close("comms")
+            self.COMMUNICATION_CONNECTIONS.discard(websocket)
             
+            # A resumed connection may replace a stalled one before it times out, only the last one closing starts the grace period
+            if len(self.COMMUNICATION_CONNECTIONS) == 0:
+                self.app.handle_websocket_close("comms")
+                self.session_expiry = asyncio.get_running_loop().call_later(self.config.session_grace_period, self.expire_session)
+            
+    #endregion
+    
+    #region - Session
+    
+    def get_resume_token(self, websocket: WebSocketServerProtocol) -> str | None:
+        """Returns the resume token the client passed in the connection url (ws://address:port/?resume=token), if any
+        """
+        request = getattr(websocket, "request", None)
+        path = request.path if request is not None else getattr(websocket, "path", "")
+        
+        tokens = parse_qs(urlsplit(path).query).get("resume", [])
+        return tokens[0] if len(tokens) > 0 else None
+    
+    def resume_session(self, token: str | None) -> bool:
+        """Reattaches to the current session if the token matches it, otherwise ends it and starts a new one.
+
+        Args:
+            token (str | None): The resume token provided by the client
+
+        Returns:
+            bool: True if the session was resumed, False if a new session was started
+        """
+        if self.session_token is not None and token == self.session_token:
+            if self.session_expiry is not None:
+                self.session_expiry.cancel()
+                self.session_expiry = None
+            return True
+        
+        if self.session_token is not None:
+            self.expire_session()
+        
+        self.session_token = secrets.token_urlsafe(16)
+        return False
+    
+    def drop_stale_connections(self):
+        """Closes the comms connections left over from before a resume, e.g. a stalled socket the keepalive hasn't timed out yet.
+        Otherwise outgoing messages could be sent to them instead of the resumed connection.
+        """
+        stale_connections = list(self.COMMUNICATION_CONNECTIONS)
+        self.COMMUNICATION_CONNECTIONS.clear()
+        
+        for connection in stale_connections:
+            asyncio.get_running_loop().create_task(connection.close())  # A stalled socket can take a while to close, don't wait for it
+    
+    def expire_session(self):
+        """Ends the current session, dropping any buffered messages
+        """
+        if self.session_expiry is not None:
+            self.session_expiry.cancel()
+            self.session_expiry = None
+        
+        self.session_token = None
+        self.pending_messages.clear()
+        self.app.handle_session_end()
+    
+    async def send_pending_messages(self, websocket: WebSocketServerProtocol):
+        """Replays the messages buffered while the client was disconnected
+        """
+        while len(self.pending_messages) > 0:
+            await websocket.send(self.pending_messages[0])
+            self.pending_messages.popleft()
+    
     #endregion
     
     #region - Sending Content
     
         
+    @profiler.timed("websocket.send_content")
     async def send_content(self, header : str, content : str):
         """Sends a given message to unity through the communications websocket.
         """
@@ -113,6 +225,12 @@ class Websocket():
             except Exception as e:
                 print(f"Error sending websocket data: {e}")
                 self.COMMUNICATION_CONNECTIONS.discard(conn)
+                if self.session_token is not None:
+                    self.pending_messages.append(header+content)
+        elif self.session_token is not None:
+            # The session is waiting for a reconnect, the message is replayed once the client resumes
+            self.pending_messages.append(header+content)
+            self.app.create_dashboard_notification(f"[WS] Buffered: {header} | {content if len(content) < 20 else content[0:20]}")
         else:
             self.app.create_dashboard_notification("[WS] Error: No active websocket.")
             return "ERROR: No active websocket..."
@@ -131,21 +249,16 @@ class Websocket():
 
         config_path = Path("./config.cfg")
 
-        if(not config_path.exists()):
-            #Create the config file
-            file = open(config_path,'x')
-            file.close()
-            
-        #Write to the config file
-        file = open(config_path,'w')
-        file.write("# Place the config file under the appdata folder for your unity project!\n")
-        file.write(f"WS_ADDRESS = ws://{address}\n")
-        file.write(f"COMMS_PORT = {utils.WEBSOCKET_COMMS_PORT}\n")
-        file.write(f"WEBCAM_PORT = {utils.WEBSOCKET_WEBCAM_PORT}\n")
-        file.close()
-        
-        
-        
+        content = "# Place the config file under the appdata folder for your unity project!\n"
+        content += f"WS_ADDRESS = ws://{address}\n"
+        content += f"COMMS_PORT = {self.config.comms_port}\n"
+        content += f"WEBCAM_PORT = {self.config.webcam_port}\n"
+
+        #Only rewrite the config file if something changed
+        if(config_path.exists() and config_path.read_text() == content):
+            return
+
+        config_path.write_text(content)
     
     #endregion
             